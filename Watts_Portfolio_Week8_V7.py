@@ -23,60 +23,53 @@
 
 # The following import allows us to sort lists using keys from tuples
 from operator import itemgetter
+# bisect lets us insert an item into a list that is already sorted without having to sort the list again
+import bisect
+# Counter is a dictionary that counts how many times each item appears in whatever it is given
+from collections import Counter
+import sys
 
 
 # The NodeTree class simply holds pointers to the next items in the tree, which are characters, and stores the nodes
 # in a list of Tuples that gradually become a list with a single Tuple in, the first part being a single node tree,
-# and the second part being the overall frequency for all the characters
+# and the second part being the overall frequency for all the characters. __slots__ stops each NodeTree from carrying
+# its own dictionary of attributes, so every node takes up much less memory
 class NodeTree:
+    __slots__ = ('left', 'right')
+
     def __init__(self, left=None, right=None):
         self.left = left
         self.right = right
 
-    def __str__(self):
-        return f"{self.left}_{self.right}"
-
     def get_children(self):
         return self.left, self.right
 
-    def get_right(self):
-        return self.right
-
-    def get_left(self):
-        return self.left
-
 
 def tally(phrase):
-    # tally() is going to create a dictionary of characters and frequencies, by looping over each letter in the
-    # phrase, and checking to see if the letter is already a key in the dictionary. If it isn't it creates it and
-    # gives it a value of one, and if it is, it adds one to it's value. It has a time complexity of O(n).
-    phrase_dict = {}
-    for letter in phrase:
-        if letter in phrase_dict:
-            phrase_dict[letter] += 1
-        else:
-            phrase_dict[letter] = 1
-    phrase_list = sorted(phrase_dict.items(), key=itemgetter(1), reverse=True)
-    # Because we have sorted the dictionary, it is now turned into a list of tuples
-    return phrase_list
+    # tally() is going to create a list of characters and frequencies. Counter does the counting for us in a single
+    # pass over the phrase, which runs as a C loop rather than a Python loop checking and updating a dictionary for
+    # every letter, and most_common() gives the list of tuples back already sorted with the most frequent character
+    # first. It has a time complexity of O(n).
+    return Counter(phrase).most_common()
 
 
 def build_nodes(tally_list):
-    # tally_list represents a list of tuples, where the first item in the tuple is the character and the second item
-    # is the frequency. A loop is set up that loops over tally_list, taking the two lowest tuples, unpacking them
-    # into the variables char and freq (char_1 and freq_1 for the last item in the list and char2, freq_2 for the
-    # second to last item in the list). The list is then defined as the list minus the last two items in it,
-    # a NodeTree is created from the characters and then that NodeTree is appended to the list with the combined
-    # frequency of those characters. This continues until we have a single NodeTree with a frequency of all of the
-    # letters in the phrase. This has a time complexity of O(n)
+    # tally_list represents a list of tuples, where the first item in the tuple is the character and the second item is
+    # the frequency. The list is first sorted into ascending order of frequency (which also makes a copy, so the tally
+    # list that was passed in is left alone for the table of codes and the sizes). A loop is set up that loops over
+    # tally_list, taking the two lowest tuples from the front of the list and unpacking them into the variables char
+    # and freq (char_1 and freq_1 for the first item in the list and char2, freq_2 for the second item). A NodeTree is
+    # created from the characters and then bisect.insort_left() puts that NodeTree into the list with the combined
+    # frequency of those characters, straight into the place that keeps the list in order, rather than adding it to the
+    # end and sorting the whole list again. This continues until we have a single NodeTree with a frequency of all of
+    # the letters in the phrase. Keeping the list in order this way costs O(n) for each step rather than O(n log n)
+    # for a full sort, so overall this has a time complexity of O(n^2)
+    tally_list = sorted(tally_list, key=itemgetter(1))
     while len(tally_list) > 1:
-        char_1, freq_1 = tally_list[-1]
-        char_2, freq_2 = tally_list[-2]
-        tally_list = tally_list[:-2]
+        char_1, freq_1 = tally_list.pop(0)
+        char_2, freq_2 = tally_list.pop(0)
         node = NodeTree(char_1, char_2)
-        tally_list.append((node, freq_1 + freq_2))
-
-        tally_list = sorted(tally_list, key=itemgetter(1), reverse=True)
+        bisect.insort_left(tally_list, (node, freq_1 + freq_2), key=itemgetter(1))
 
     return tally_list
 
@@ -108,45 +101,52 @@ def print_huffman_table(c_tally, n_tree):
     # they occur. It uses the frequency list of tuples - c_tally (character and frequency) produced by the tally
     # function. It also uses the dictionary produced by the huffman encode function - n_tree -  which contains the
     # characters and their huffman code. This is unnecessary for the encoding / decoding to work but does demonstrate
-    # the logic that has gone before.
-    print("\n*****************************************")
-    print("************* Huffman Codes *************")
-    print("*****************************************")
-    print("\nCharacter    | Huffman Code | Frequency")
-    print("_______________________________________")
+    # the logic that has gone before. Each row of the table is added to a list first and the whole table is then
+    # written out in one go, rather than calling print() for every one of the characters.
+    rows = ["\n*****************************************",
+            "************* Huffman Codes *************",
+            "*****************************************",
+            "\nCharacter    | Huffman Code | Frequency",
+            "_______________________________________"]
     for (char, frequency) in c_tally:
-        print(f"{char!r:12} | {n_tree[char]:12} | {frequency}")
+        rows.append(f"{char!r:12} | {n_tree[char]:12} | {frequency}")
+    sys.stdout.write("\n".join(rows) + "\n")
 
 
 def create_huffman_string(phrase, coding_dict):
     # Once we have the dictionary of characters and their codes, it is relatively simple to create the binary string
-    # that represents the phrase. Vy looping over each character in the phrase, we find it's code in the dictionary
-    # and add that code to the string that will be returned.This has a time complexity of O(n)
-    coded_string = ""
+    # that represents the phrase. Vy looping over each character in the phrase, we find it's code in the dictionary and
+    # add that code to a list, which is joined together into the string that will be returned. Joining the list once at
+    # the end avoids building a new, longer string every time a code is added.This has a time complexity of O(n)
+    coded_string = []
     for char in phrase:
-        coded_string += coding_dict[char]
-    return coded_string
+        coded_string.append(coding_dict[char])
+    return "".join(coded_string)
 
 
 def decode(huffman_dict, huffman_string):
-    # The decoding of the string requires the binary string representing the phrase and the dictionary of characters
-    # and codes. It uses a nested loop, which traverses through the binary string one character at a time,
-    # adding each 0 or 1 to the temp_huff variable. Each time another character is added, it moves to the inner loop
-    # and traverses through the dictionary trying to find a code that matches. If it does, it adds that matching
-    # character to the text variable, sets temp_huff back to an empty string, breaks out of the inner loop,
-    # and carries on from the point in the binary string where it left off. This way it can build the original phrase
-    # back up again. This method has a time complexity of O(n^2) which is the worst of all the functions, but doesn't
-    # seem required for the assignment - I have added it for completeness.
-    text = ""
+    # The decoding of the string requires the binary string representing the phrase and the dictionary of characters and
+    # codes. The dictionary is first turned around into inverse_dict, so that each code gives back its character, and
+    # the length of the longest code is worked out. The loop traverses through the binary string one character at a
+    # time, adding each 0 or 1 to the temp_huff variable. Each time another character is added, it looks temp_huff up in
+    # inverse_dict, rather than searching through every code in the dictionary. If it is there, it adds that matching
+    # character to the text list (which is joined into a string once at the end), sets temp_huff back to an empty
+    # string, and carries on from the point in the binary string where it left off. This way it can build the original
+    # phrase back up again. If temp_huff ever gets longer than the longest code then the string can't have been made
+    # from this dictionary. Finding a code in a dictionary takes the same time however many codes there are, so this
+    # method has a time complexity of O(n).
+    inverse_dict = {h_code: h_char for h_char, h_code in huffman_dict.items()}
+    max_length = max(len(h_code) for h_code in huffman_dict.values())
+    text = []
     temp_huff = ""
     for char in huffman_string:
         temp_huff += char
-        for h_char, h_code in huffman_dict.items():
-            if h_code == temp_huff:
-                text += h_char
-                temp_huff = ""
-                break
-    return text
+        if temp_huff in inverse_dict:
+            text.append(inverse_dict[temp_huff])
+            temp_huff = ""
+        elif len(temp_huff) > max_length:
+            raise ValueError("huffman_string contains a code that is not in huffman_dict")
+    return "".join(text)
 
 
 def size_of_original(phrase):